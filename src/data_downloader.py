@@ -8,25 +8,168 @@ ativo financeiro.
 
 Funções:
     fetch_ohlcv_data: Baixa dados OHLCV em um período específico,
-                      gerenciando a paginação da API.
+                      buscando as janelas da API em paralelo.
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import ccxt
+import ccxt.async_support as ccxt_async
+from aiolimiter import AsyncLimiter
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from tqdm import tqdm
+
+# --- Constantes ---
+# Número máximo de velas retornadas pela Binance em uma única requisição
+CANDLES_PER_REQUEST = 1000
+
+# Número máximo de requisições simultâneas em voo contra a API
+MAX_CONCURRENT_REQUESTS = 10
+
+# Cota de peso de requisições da Binance por minuto (por IP) e o peso de
+# cada chamada de velas (klines); consumidos por um token bucket
+RATE_LIMIT_WEIGHT_PER_MINUTE = 1200
+KLINES_REQUEST_WEIGHT = 2
+
+# Espera máxima (em segundos) do backoff exponencial ao atingir o limite da API
+MAX_BACKOFF_SECONDS = 60
+
+# Diretório do cache local dos dados baixados (na raiz do projeto)
+CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "cache"
+
+# Chave (em DataFrame.attrs / metadados do Parquet) com a data de início, em
+# milissegundos, a partir da qual o cache foi baixado
+CACHE_START_ATTR = 'cache_start_timestamp'
+
+
+async def _fetch_ohlcv_async(symbol: str, start_timestamp: int, timeframe: str,
+                             rate_limit_weight: int = RATE_LIMIT_WEIGHT_PER_MINUTE) -> list:
+    """
+    Baixa em paralelo todos os lotes OHLCV desde 'start_timestamp' até agora.
+
+    O intervalo é dividido em janelas de CANDLES_PER_REQUEST velas e cada
+    janela é buscada por uma corrotina própria, limitadas por um semáforo.
+    O ritmo das requisições é controlado por um token bucket com
+    'rate_limit_weight' de peso por minuto, no lugar do espaçamento fixo do ccxt.
 
-def fetch_ohlcv_data(symbol: str, start_date: str, timeframe: str = '1h') -> pd.DataFrame:
+    Returns:
+        list: Lista de lotes (listas de velas), na ordem das janelas.
+    """
+    # 1. Inicializa a conexão assíncrona com a exchange (Binance, neste caso)
+    #    O throttle interno do ccxt é desligado: o limiter abaixo faz esse papel
+    exchange = ccxt_async.binance({'enableRateLimit': False})
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limiter = AsyncLimiter(max_rate=max(rate_limit_weight, KLINES_REQUEST_WEIGHT), time_period=60)
+    progress = None
+
+    async def fetch_one(since: int) -> list:
+        async with semaphore:
+            attempt = 0
+            while True:
+                try:
+                    await limiter.acquire(KLINES_REQUEST_WEIGHT)
+                    ohlcv = await exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=CANDLES_PER_REQUEST)
+                    # Feedback para o usuário: avança a barra pelo número de velas do lote
+                    progress.update(len(ohlcv))
+                    return ohlcv
+                except (ccxt.DDoSProtection, ccxt.RateLimitExceeded) as e:
+                    # Limite da API atingido: backoff exponencial
+                    delay = min(2 ** attempt, MAX_BACKOFF_SECONDS)
+                    attempt += 1
+                    tqdm.write(f"Limite de requisições atingido: {e}. Aguardando {delay}s...")
+                    await asyncio.sleep(delay)
+                except ccxt.NetworkError as e:
+                    tqdm.write(f"Erro de rede: {e}. Tentando novamente...")
+                    await asyncio.sleep(5) # Espera 5 segundos antes de tentar novamente
+
+    try:
+        # 2. Pré-calcula o início ('since') de cada janela até a data atual
+        end_timestamp = exchange.milliseconds()
+        timeframe_ms = exchange.parse_timeframe(timeframe) * 1000
+        step = CANDLES_PER_REQUEST * timeframe_ms
+        sinces = range(start_timestamp, end_timestamp, step)
+
+        # 3. Dispara todas as janelas em paralelo
+        progress = tqdm(total=max(0, (end_timestamp - start_timestamp) // timeframe_ms), unit='velas')
+        return await asyncio.gather(*(fetch_one(since) for since in sinces))
+    finally:
+        if progress is not None:
+            progress.close()
+        await exchange.close()
+
+
+def _run_coroutine(coro):
+    """
+    Executa uma corrotina a partir de código síncrono e retorna o seu resultado.
+
+    Se já houver um loop de eventos rodando nesta thread (ex: kernel do
+    Jupyter), asyncio.run() falharia; nesse caso a corrotina roda em uma
+    thread auxiliar com um loop próprio.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+def _batches_to_dataframe(batches: list) -> pd.DataFrame:
+    """
+    Converte os lotes retornados pela API em um DataFrame OHLCV indexado por timestamp.
+
+    Retorna um DataFrame vazio se os lotes não contiverem nenhuma vela.
+    """
+    # O número de velas é conhecido assim que os lotes chegam: pré-aloca um
+    # único buffer float64 e copia cada lote direto para a sua fatia.
+    n_candles = sum(len(batch) for batch in batches)
+    if n_candles == 0:
+        return pd.DataFrame()
+
+    buffer = np.empty((n_candles, 6), dtype=np.float64)
+    cursor = 0
+    for batch in batches:
+        if not batch:
+            continue
+        arr = np.asarray(batch, dtype=np.float64)
+        buffer[cursor:cursor + len(arr)] = arr
+        cursor += len(arr)
+
+    # Remove velas duplicadas (mesmo timestamp) entre janelas, mantendo a ordem
+    if not np.all(np.diff(buffer[:, 0]) > 0):
+        _, unique_idx = np.unique(buffer[:, 0], return_index=True)
+        buffer = buffer[unique_idx]
+
+    # Monta o DataFrame a partir do buffer, já com o timestamp como índice
+    timestamps = pd.DatetimeIndex(buffer[:, 0].astype('int64').view('datetime64[ms]'), name='timestamp')
+    return pd.DataFrame(buffer[:, 1:], index=timestamps, columns=['open', 'high', 'low', 'close', 'volume'])
+
+
+def fetch_ohlcv_data(symbol: str, start_date: str, timeframe: str = '1h',
+                     rate_limit_weight: int = RATE_LIMIT_WEIGHT_PER_MINUTE) -> pd.DataFrame:
     """
     Busca dados históricos OHLCV da Binance.
 
-    A função gerencia a paginação para buscar todos os dados desde a
-    data de início até o presente momento em um único chamado.
+    A função divide o período desde a data de início até o presente
+    momento em janelas e as baixa em paralelo em um único chamado.
+    Os dados baixados ficam em cache (Parquet) por (símbolo, timeframe):
+    chamadas seguintes baixam apenas as velas posteriores ao cache.
 
     Args:
         symbol (str): O símbolo do ativo no formato da corretora (ex: 'BTC/USDT').
         start_date (str): A data de início no formato 'YYYY-MM-DD'.
         timeframe (str, optional): O intervalo de tempo das velas. 
                                    Padrão é '1h' (1 hora).
+        rate_limit_weight (int, optional): Peso de requisições por minuto que
+                                   este download pode consumir. A cota da
+                                   Binance é por IP: downloads simultâneos
+                                   devem dividi-la entre si.
+                                   Padrão é RATE_LIMIT_WEIGHT_PER_MINUTE.
 
     Returns:
         pd.DataFrame: Um DataFrame do Pandas com os dados OHLCV,
@@ -34,77 +177,69 @@ def fetch_ohlcv_data(symbol: str, start_date: str, timeframe: str = '1h') -> pd.
                       se nenhum dado for encontrado.
     """
     print("Inicializando o coletor de dados...")
-    
-    # 1. Inicializa a conexão com a exchange (Binance, neste caso)
-    exchange = ccxt.binance()
 
-    # exchange.session.verify = True
-
-    # 2. Converte a data de início para o formato de timestamp em milissegundos
-    #    que a API da CCXT espera.
+    # Converte a data de início para o formato de timestamp em milissegundos
+    # que a API da CCXT espera.
     try:
         start_timestamp = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
     except ValueError:
         print("Erro: Formato de data inválido. Use 'YYYY-MM-DD'.")
         return pd.DataFrame()
 
-    all_data = []
-    
+    # Reaproveita o cache se ele já cobre a data de início pedida. A cobertura
+    # é a data de início com que o cache foi baixado (salva nos metadados do
+    # Parquet), e não a primeira vela: ela pode ser posterior ao início pedido
+    # (fuso horário local, listagem do ativo). A última vela do cache pode ter
+    # sido salva ainda aberta, então ela é baixada de novo.
+    cache_path = CACHE_DIR / f"{symbol.replace('/', '_')}_{timeframe}.parquet"
+    download_from = start_timestamp
+    cache_start = start_timestamp
+    df_cached = pd.DataFrame()
+    if cache_path.exists():
+        df_cached = pd.read_parquet(cache_path)
+        cached_start = df_cached.attrs.get(CACHE_START_ATTR)
+        if cached_start is None and not df_cached.empty:
+            cached_start = df_cached.index.min().value // 1_000_000
+        if not df_cached.empty and start_timestamp >= cached_start:
+            cache_start = cached_start
+            download_from = df_cached.index.max().value // 1_000_000
+            print(f"Cache encontrado ({cache_path.name}). Baixando apenas a partir de {df_cached.index.max()}...")
+        else:
+            df_cached = pd.DataFrame()
+
     print(f"Iniciando download dos dados para {symbol} desde {start_date}...")
 
-    # 3. Loop de Paginação: Busca os dados em lotes até chegar na data atual.
-    while start_timestamp < exchange.milliseconds():
-        try:
-            # Busca um lote de dados a partir do último timestamp (UTC time zone) conhecido
-            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=start_timestamp)
-            
-            # Se a API não retornar mais dados, saímos do loop
-            if not ohlcv:
-                break
-
-            all_data.extend(ohlcv)
-            
-            # Atualiza o timestamp de início para a última candlestick recebido + 1
-            # para evitar buscar dados duplicados na próxima iteração.
-            last_timestamp = ohlcv[-1][0]
-            start_timestamp = last_timestamp + 1
-            
-            # Feedback para o usuário sobre o progresso
-            last_date_readable = datetime.fromtimestamp(last_timestamp / 1000).strftime('%Y-%m-%d')
-            print(f"   Lote recebido. Última data: {last_date_readable}")
-
-            # Respeita o limite de requisições da API para evitar bloqueios
-            exchange.sleep(exchange.rateLimit / 1000)
-
-        except ccxt.NetworkError as e:
-            print(f"Erro de rede: {e}. Tentando novamente...")
-            exchange.sleep(5) # Espera 5 segundos antes de tentar novamente
-        except ccxt.ExchangeError as e:
-            print(f"Erro da exchange: {e}")
-            return pd.DataFrame() # Encerra em caso de erro da exchange (ex: símbolo inválido)
+    try:
+        batches = _run_coroutine(_fetch_ohlcv_async(symbol, download_from, timeframe, rate_limit_weight))
+    except ccxt.ExchangeError as e:
+        print(f"Erro da exchange: {e}")
+        return pd.DataFrame() # Encerra em caso de erro da exchange (ex: símbolo inválido)
 
     print("Download concluído. Processando dados...")
 
-    if not all_data:
+    df = _batches_to_dataframe(batches)
+    if not df_cached.empty:
+        # Velas recém-baixadas substituem as do cache com o mesmo timestamp
+        df = pd.concat([df_cached, df]) if not df.empty else df_cached
+        df = df[~df.index.duplicated(keep='last')]
+
+    if df.empty:
         print("Nenhum dado foi baixado.")
         return pd.DataFrame()
 
-    # 4. Converte a lista de listas em um DataFrame do Pandas
-    df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    df.attrs = {CACHE_START_ATTR: int(cache_start)}
+    df.to_parquet(cache_path, compression='zstd')
 
-    # 5. Converte a coluna de timestamp para um formato de data legível e a define como índice
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df.set_index('timestamp', inplace=True)
-    
-    # Garante que os tipos de dados estão corretos (float para OHLC e volume)
-    df = df.astype(float)
+    # O cache pode começar antes da data pedida
+    df = df.loc[df.index >= pd.Timestamp(start_timestamp, unit='ms')]
+    df.attrs = {}
 
     print("Processamento finalizado com sucesso.")
     return df
 
 if __name__ == '__main__':
     import os
-    from pathlib import Path
     # Bloco de teste para executar o script diretamente
     
     # Parâmetros de teste
@@ -132,12 +267,12 @@ if __name__ == '__main__':
         print(f"Período dos dados: de {btc_data.index.min()} até {btc_data.index.max()}")
 
         try:
-            from pathlib import Path
             # Caminho da raiz do projeto
             DATA_RAW = ROOT / "data" / "raw"
             DATA_RAW.mkdir(parents=True, exist_ok=True)
-            OUT_PATH = DATA_RAW / "test.csv"
-            btc_data.to_csv(OUT_PATH, index=False)
+            OUT_PATH = DATA_RAW / "test.parquet"
+            # Parquet preserva os tipos e o índice de timestamp
+            btc_data.to_parquet(OUT_PATH, compression='zstd', compression_level=3)
 
             print("Working directory:", os.getcwd())
 
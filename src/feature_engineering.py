@@ -6,8 +6,10 @@ Este módulo contém funções para criar variáveis preditoras (features)
 e a variável-alvo (target) a partir dos dados brutos OHLCV.
 """
 
+import bottleneck as bn
 import numpy as np
 import pandas as pd
+from numba import njit
 
 # Importa a função de download para usar nos testes
 from data_downloader import fetch_ohlcv_data
@@ -21,76 +23,188 @@ SHORT_TERM_WINDOW = 24  # 1 dia
 MID_TERM_WINDOW = 168  # 7 dias
 LONG_TERM_WINDOW = 720 # 30 dias
 
+# Nanossegundos por hora e por dia, para extrair features de tempo do índice
+NS_PER_HOUR = 3_600_000_000_000
+NS_PER_DAY = 24 * NS_PER_HOUR
+
 
 def create_target_variable(df: pd.DataFrame, window: int = SHORT_TERM_WINDOW) -> pd.DataFrame:
     """
     Cria a variável-alvo: a volatilidade realizada das próximas 'window' horas.
     """
     print("Iniciando a criação da variável-alvo...")
-    df['log_returns'] = np.log(df['close'] / df['close'].shift(1))
+    # log(c[i] / c[i-1]) = log(c[i]) - log(c[i-1]): um único np.log vetorizado
+    # sobre os preços e uma diferença entre fatias contíguas
+    log_close = np.log(df['close'].to_numpy(dtype=np.float64))
+    log_returns = np.empty_like(log_close)
+    log_returns[:1] = np.nan
+    log_returns[1:] = np.diff(log_close)
+    df['log_returns'] = log_returns
     
-    future_volatility = df['log_returns'].shift(-window).rolling(window=window).std()
+    # A volatilidade futura em i (retornos i+1 .. i+window) é a volatilidade
+    # passada em i+window: basta deslocar um único desvio padrão móvel.
+    # (o bottleneck rejeita janelas maiores que a série; nesse caso não há alvo)
+    future_volatility = np.full_like(log_returns, np.nan)
+    if len(log_returns) > window:
+        rolling_std = bn.move_std(log_returns, window=window, min_count=window, ddof=1)
+        if window > 1:
+            # Janelas com log-retornos todos iguais têm volatilidade exatamente 0,
+            # a mesma regra do kernel de features (o bottleneck deixa um resíduo)
+            changed = np.ones_like(log_returns)
+            changed[1:] = log_returns[1:] != log_returns[:-1]
+            unchanged_window = bn.move_sum(changed, window=window - 1, min_count=window - 1) == 0
+            rolling_std[unchanged_window] = 0.0
+        future_volatility[:-window] = rolling_std[window:]
     df['target_volatility'] = future_volatility * ANNUALIZATION_FACTOR
     
     print("Criação da variável-alvo concluída.")
     return df
 
-# --- Funções Modulares para Criação de Features ---
+# Features de janelas móveis, na ordem das colunas produzidas pelo kernel
+ROLLING_FEATURE_NAMES = [
+    f'vol_realizada_{SHORT_TERM_WINDOW}h',
+    f'vol_realizada_{MID_TERM_WINDOW}h',
+    f'vol_realizada_{LONG_TERM_WINDOW}h',
+    'vol_ratio_24_168',
+    f'retorno_acumulado_{SHORT_TERM_WINDOW}h',
+    f'retorno_acumulado_{MID_TERM_WINDOW}h',
+    'atr_24h',
+    f'media_movel_volume_{SHORT_TERM_WINDOW}h',
+    f'media_movel_volume_{MID_TERM_WINDOW}h',
+    'volume_ratio_1_24',
+]
 
-def add_volatility_features(df: pd.DataFrame) -> pd.DataFrame:
-    """Adiciona features baseadas na volatilidade passada (realizada)."""
-    print("Adicionando features de volatilidade...")
-    
-    # Volatilidade realizada para diferentes janelas de tempo passadas
-    for window in [SHORT_TERM_WINDOW, MID_TERM_WINDOW, LONG_TERM_WINDOW]:
-        col_name = f'vol_realizada_{window}h'
-        df[col_name] = df['log_returns'].rolling(window=window).std() * ANNUALIZATION_FACTOR
+# --- Kernels Numba ---
+# fastmath não é usado: ele assume ausência de NaN e quebraria os np.isnan abaixo.
 
-    # Rácios de volatilidade para capturar aceleração
-    df['vol_ratio_24_168'] = df[f'vol_realizada_{SHORT_TERM_WINDOW}h'] / df[f'vol_realizada_{MID_TERM_WINDOW}h']
-    
-    return df
+@njit(cache=True)
+def _true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray, i: int) -> float:
+    """True range da vela i; na primeira vela (sem fechamento anterior) é high - low."""
+    true_range = high[i] - low[i]
+    if i == 0:
+        return true_range
+    # Ignora NaNs como o np.fmax / max(axis=1) do pandas
+    for candidate in (abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1])):
+        if np.isnan(true_range) or candidate > true_range:
+            true_range = candidate
+    return true_range
+
+@njit(cache=True, error_model='numpy')
+def _build_rolling_features(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                            volume: np.ndarray, log_returns: np.ndarray, out: np.ndarray,
+                            start: int) -> None:
+    """
+    Preenche 'out' ((n - start) x len(ROLLING_FEATURE_NAMES), já com NaN) em uma única passada.
 
-def add_momentum_features(df: pd.DataFrame) -> pd.DataFrame:
-    """Adiciona features de momentum e retorno."""
-    print("Adicionando features de momentum...")
+    Cada janela móvel mantém média, soma dos quadrados dos desvios (M2) e
+    contagem de valores válidos, atualizadas em O(1) pelo método de Welford
+    ao entrar o elemento i e sair o i-w; ao contrário de somas brutas, isso
+    não acumula erro de arredondamento ao longo da série. Assim como no
+    pandas, uma janela só produz valor quando está completa e sem NaN, e uma
+    janela de log-retornos todos iguais tem volatilidade exatamente 0.
+    As linhas antes de 'start' só aquecem as janelas: a linha i vai para out[i - start].
+    """
+    n = close.shape[0]
+    # Janelas 0-2: log-retornos (volatilidade e retornos acumulados),
+    # janela 3: true range (ATR), janelas 4-5: volume
+    windows = (SHORT_TERM_WINDOW, MID_TERM_WINDOW, LONG_TERM_WINDOW,
+               SHORT_TERM_WINDOW, SHORT_TERM_WINDOW, MID_TERM_WINDOW)
+    means = np.zeros(6)
+    m2s = np.zeros(6)
+    counts = np.zeros(6, dtype=np.int64)
+    # Quantos log-retornos consecutivos (até i) são iguais ao atual
+    same_run = 0
 
-    # Retornos acumulados para diferentes janelas
-    for window in [SHORT_TERM_WINDOW, MID_TERM_WINDOW]:
-        col_name = f'retorno_acumulado_{window}h'
-        df[col_name] = df['log_returns'].rolling(window=window).sum()
+    for i in range(n):
+        true_range = _true_range(high, low, close, i)
+        if i > 0 and log_returns[i] == log_returns[i - 1]:
+            same_run += 1
+        else:
+            same_run = 1
 
-    # Average True Range (ATR)
-    high_low = df['high'] - df['low']
-    high_close = np.abs(df['high'] - df['close'].shift())
-    low_close = np.abs(df['low'] - df['close'].shift())
-    
-    true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    df['atr_24h'] = true_range.rolling(window=SHORT_TERM_WINDOW).mean()
-    
-    return df
+        for k in range(6):
+            w = windows[k]
+            x_new = log_returns[i] if k < 3 else (true_range if k == 3 else volume[i])
+            if not np.isnan(x_new):
+                counts[k] += 1
+                delta = x_new - means[k]
+                means[k] += delta / counts[k]
+                m2s[k] += delta * (x_new - means[k])
+            if i >= w:
+                j = i - w
+                x_old = log_returns[j] if k < 3 else (_true_range(high, low, close, j) if k == 3 else volume[j])
+                if not np.isnan(x_old):
+                    counts[k] -= 1
+                    if counts[k] == 0:
+                        means[k] = 0.0
+                        m2s[k] = 0.0
+                    else:
+                        delta = x_old - means[k]
+                        means[k] -= delta / counts[k]
+                        m2s[k] -= delta * (x_old - means[k])
 
-def add_volume_features(df: pd.DataFrame) -> pd.DataFrame:
-    """Adiciona features baseadas em volume de negociação."""
-    print("Adicionando features de volume...")
+            if i < start or counts[k] != w:
+                continue
+            if k < 3:
+                # Volatilidade realizada (desvio padrão com ddof=1, anualizado)
+                var = m2s[k] / (w - 1)
+                if same_run >= w or var <= 0.0:
+                    out[i - start, k] = 0.0
+                else:
+                    out[i - start, k] = np.sqrt(var) * ANNUALIZATION_FACTOR
+                if k < 2:
+                    # Retornos acumulados
+                    out[i - start, 4 + k] = means[k] * w
+            else:
+                # ATR e médias móveis de volume
+                out[i - start, 3 + k] = means[k]
 
-    # Médias móveis de volume
-    for window in [SHORT_TERM_WINDOW, MID_TERM_WINDOW]:
-        col_name = f'media_movel_volume_{window}h'
-        df[col_name] = df['volume'].rolling(window=window).mean()
-        
-    # Anomalia de volume (volume da última hora vs média das 24h)
-    df['volume_ratio_1_24'] = df['volume'] / df[f'media_movel_volume_{SHORT_TERM_WINDOW}h']
+        if i < start:
+            continue
+        # Rácio de volatilidade (aceleração) e anomalia de volume
+        row = out[i - start]
+        row[3] = row[0] / row[1]
+        row[9] = volume[i] / row[7]
 
-    return df
+# --- Funções Modulares para Criação de Features ---
+
+def add_rolling_features(df: pd.DataFrame, warmup: int = 0) -> pd.DataFrame:
+    """
+    Adiciona as features de volatilidade, momentum e volume.
+
+    Todas dependem de janelas móveis e são calculadas juntas por um único
+    kernel Numba, em uma só passada sobre os dados. As primeiras 'warmup'
+    linhas só aquecem as janelas e não aparecem no DataFrame retornado.
+    """
+    print("Adicionando features de volatilidade, momentum e volume...")
+
+    warmup = min(warmup, len(df))
+    out = np.full((len(df) - warmup, len(ROLLING_FEATURE_NAMES)), np.nan)
+    _build_rolling_features(
+        df['high'].to_numpy(dtype=np.float64),
+        df['low'].to_numpy(dtype=np.float64),
+        df['close'].to_numpy(dtype=np.float64),
+        df['volume'].to_numpy(dtype=np.float64),
+        df['log_returns'].to_numpy(dtype=np.float64),
+        out,
+        warmup,
+    )
+    rolling_features = pd.DataFrame(out, index=df.index[warmup:], columns=ROLLING_FEATURE_NAMES)
+
+    return pd.concat([df.iloc[warmup:], rolling_features], axis=1)
 
 def add_time_features(df: pd.DataFrame) -> pd.DataFrame:
     """Adiciona features baseadas no tempo (cíclicas)."""
     print("Adicionando features de tempo...")
     
-    df['hora_do_dia'] = df.index.hour
-    df['dia_da_semana'] = df.index.dayofweek # Segunda=0, Domingo=6
-    df['mes_do_ano'] = df.index.month
+    # Aritmética inteira sobre os nanossegundos (UTC) do índice, sem
+    # passar pelos acessores do DatetimeIndex
+    ns = df.index.as_unit('ns').asi8
+    days = ns // NS_PER_DAY
+
+    df['hora_do_dia'] = ((ns // NS_PER_HOUR) % 24).astype(np.int8)
+    df['dia_da_semana'] = ((days + 3) % 7).astype(np.int8) # 1970-01-01 foi quinta; Segunda=0, Domingo=6
+    df['mes_do_ano'] = (ns.view('M8[ns]').astype('M8[M]').view(np.int64) % 12 + 1).astype(np.int8)
     
     return df
 
@@ -100,22 +214,38 @@ def create_all_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Pipeline completo para criar todas as features a partir dos dados brutos.
 
+    Só são materializadas as linhas utilizáveis no treinamento: as
+    LONG_TERM_WINDOW primeiras (aquecimento da janela mais longa) e as
+    finais sem alvo (que depende das horas seguintes) são descartadas.
+
     Args:
         df (pd.DataFrame): DataFrame com dados OHLCV e a coluna 'log_returns'.
 
     Returns:
-        pd.DataFrame: DataFrame com todas as features adicionadas.
+        pd.DataFrame: DataFrame com todas as features adicionadas, em float32
+                      (exceto 'target_volatility', mantida em float64).
     """
     print("\nIniciando pipeline de criação de features...")
-    
-    # Copia o DF para evitar o SettingWithCopyWarning
-    df_featured = df.copy()
-    
-    # Executa cada módulo de criação de feature em sequência
-    df_featured = add_volatility_features(df_featured)
-    df_featured = add_momentum_features(df_featured)
-    df_featured = add_volume_features(df_featured)
+
+    # Corta de antemão o final sem alvo definido; as features não olham
+    # para o futuro, então isso não altera as linhas restantes
+    end = len(df)
+    if 'target_volatility' in df.columns:
+        valid_target = np.flatnonzero(df['target_volatility'].notna().to_numpy())
+        end = valid_target[-1] + 1 if len(valid_target) else 0
+
+    # add_rolling_features devolve um novo DataFrame, então o original
+    # não é modificado e não é preciso copiá-lo antes
+    df_featured = add_rolling_features(df.iloc[:end], warmup=LONG_TERM_WINDOW)
     df_featured = add_time_features(df_featured)
+
+    # Reduz as features para float32 (precisão usada pelos frameworks de ML);
+    # a variável-alvo continua em float64 para estabilidade do treinamento
+    feature_cols = [
+        col for col in df_featured.columns
+        if col != 'target_volatility' and df_featured[col].dtype == np.float64
+    ]
+    df_featured[feature_cols] = df_featured[feature_cols].astype(np.float32, copy=False)
     
     print("Pipeline de criação de features concluído.")
     return df_featured
@@ -158,6 +288,6 @@ if __name__ == '__main__':
         print(final_df_cleaned.head())
         
         print("\n" + "-"*40)
-        print(f"Shape original: {final_df.shape}")
+        print(f"Shape original: {data_with_target.shape}")
         print(f"Shape após remover NaNs: {final_df_cleaned.shape}")
-        print(f"Perda de dados para aquecimento das features: {final_df.shape[0] - final_df_cleaned.shape[0]} linhas")
+        print(f"Perda de dados para aquecimento das features: {data_with_target.shape[0] - final_df_cleaned.shape[0]} linhas")
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo do Pipeline de Dados para Múltiplos Ativos.
+
+Este módulo encadeia o download dos dados brutos e a engenharia de
+features para vários ativos, processando cada um em um processo separado.
+
+Funções:
+    process_symbol: Baixa, cria as features e salva o dataset de um ativo.
+    apply_pipeline: Executa process_symbol em paralelo para vários ativos.
+"""
+
+import multiprocessing as mp
+import os
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from data_downloader import RATE_LIMIT_WEIGHT_PER_MINUTE, fetch_ohlcv_data
+from feature_engineering import create_all_features, create_target_variable
+
+# --- Constantes ---
+# Diretório dos datasets finais, prontos para o treinamento (na raiz do projeto)
+PROCESSED_DIR = Path(__file__).resolve().parent.parent / "data" / "processed"
+
+
+def process_symbol(symbol: str, start_date: str, timeframe: str = '1h',
+                   rate_limit_weight: int = RATE_LIMIT_WEIGHT_PER_MINUTE) -> Optional[Path]:
+    """
+    Executa o pipeline completo para um único ativo.
+
+    Baixa os dados OHLCV, cria a variável-alvo e as features, remove as
+    linhas com NaN (aquecimento das janelas) e salva o resultado em Parquet.
+
+    Args:
+        symbol (str): O símbolo do ativo no formato da corretora (ex: 'BTC/USDT').
+        start_date (str): A data de início no formato 'YYYY-MM-DD'.
+        timeframe (str, optional): O intervalo de tempo das velas.
+                                   Padrão é '1h' (1 hora).
+        rate_limit_weight (int, optional): Parcela da cota de peso por minuto
+                                   da Binance reservada para este download.
+
+    Returns:
+        Optional[Path]: O caminho do arquivo salvo, ou None se nenhum dado
+                        foi baixado.
+    """
+    data_raw = fetch_ohlcv_data(
+        symbol=symbol,
+        start_date=start_date,
+        timeframe=timeframe,
+        rate_limit_weight=rate_limit_weight,
+    )
+    if data_raw.empty:
+        return None
+
+    data_with_target = create_target_variable(data_raw)
+    final_df = create_all_features(data_with_target).dropna()
+
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = PROCESSED_DIR / f"{symbol.replace('/', '_')}_{timeframe}.parquet"
+    final_df.to_parquet(out_path, compression='zstd')
+
+    return out_path
+
+def _report_error(symbol: str, error: BaseException) -> None:
+    """Callback de erro do pool: registra a falha sem interromper os demais ativos."""
+    print(f"Erro ao processar {symbol}: {error}")
+
+def apply_pipeline(symbols: List[str], start_date: str, timeframe: str = '1h') -> Dict[str, Optional[Path]]:
+    """
+    Executa o pipeline para vários ativos em paralelo, um processo por ativo.
+
+    Uma falha em um ativo é reportada e não aborta o processamento dos demais.
+    A cota de peso da Binance é por IP, então ela é dividida igualmente
+    entre os processos para que juntos não a ultrapassem.
+
+    Args:
+        symbols (List[str]): Os símbolos dos ativos (ex: ['BTC/USDT', 'ETH/USDT']).
+        start_date (str): A data de início no formato 'YYYY-MM-DD'.
+        timeframe (str, optional): O intervalo de tempo das velas.
+                                   Padrão é '1h' (1 hora).
+
+    Returns:
+        Dict[str, Optional[Path]]: Para cada símbolo, o caminho do arquivo
+                                   salvo, ou None se não houve dados ou o ativo falhou.
+    """
+    if not symbols:
+        return {}
+
+    processes = min(len(symbols), os.cpu_count() or 1)
+    rate_limit_weight = RATE_LIMIT_WEIGHT_PER_MINUTE // processes
+    print(f"Processando {len(symbols)} ativo(s) com {processes} processo(s)...")
+
+    with mp.Pool(processes=processes) as pool:
+        pending = {
+            symbol: pool.apply_async(
+                process_symbol,
+                (symbol, start_date, timeframe, rate_limit_weight),
+                error_callback=partial(_report_error, symbol),
+            )
+            for symbol in symbols
+        }
+        # Aguarda todos os ativos antes de sair do 'with' (que encerra o pool)
+        pool.close()
+        pool.join()
+
+    return {
+        symbol: result.get() if result.successful() else None
+        for symbol, result in pending.items()
+    }
+
+
+if __name__ == '__main__':
+    # Bloco de teste para o pipeline com múltiplos ativos
+
+    TEST_SYMBOLS = ['BTC/USDT', 'ETH/USDT']
+    TEST_START_DATE = '2024-01-01'
+    TEST_TIMEFRAME = '1h'
+
+    saved_paths = apply_pipeline(TEST_SYMBOLS, TEST_START_DATE, TEST_TIMEFRAME)
+
+    print("\n--- Resultado do Pipeline ---")
+    for symbol, path in saved_paths.items():
+        print(f"{symbol}: {path if path is not None else 'sem dados'}")